@@ -1,5 +1,13 @@
+import hashlib
+import heapq
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+import orjson
 import requests
+from numba import njit
 from flask import Flask, request, jsonify, render_template
 from thefuzz import process
 
@@ -12,47 +20,152 @@ app = Flask(__name__, template_folder='.', static_folder='.', static_url_path=''
 
 # --- FPL Data Handling ---
 FPL_API_URL = 'https://fantasy.premierleague.com/api/bootstrap-static/'
+FIXTURES_URL = 'https://fantasy.premierleague.com/api/fixtures/'
+REQUEST_TIMEOUT = 5 # Seconds, so a slow FPL API can't hang a request indefinitely
+CACHE_TTL = 600 # Seconds before cached FPL data is considered stale and re-fetched
 fpl_data = None
 fixtures_data = None
+fpl_data_fetched_at = None
+fixtures_data_fetched_at = None
+fpl_index = None
+players_response = None # (serialized /api/players body, ETag), rebuilt whenever fpl_data is fetched
+
+# A shared session keeps connections to the FPL API alive between calls.
+_session = requests.Session()
+
+def is_stale(fetched_at):
+    """Returns True if data fetched at the given monotonic time needs refreshing."""
+    return fetched_at is None or time.monotonic() - fetched_at > CACHE_TTL
 
 def fetch_fpl_data():
-    """Fetches and caches the main FPL bootstrap data."""
-    global fpl_data
-    if fpl_data is None:
+    """Fetches and caches the main FPL bootstrap data, refreshing it once it goes stale."""
+    global fpl_data, fpl_data_fetched_at
+    if fpl_data is None or is_stale(fpl_data_fetched_at):
         try:
-            response = requests.get(FPL_API_URL)
+            response = _session.get(FPL_API_URL, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
-            fpl_data = response.json()
+            new_fpl_data = response.json()
+            cache_player_image_urls(new_fpl_data)
+            cache_players_response(new_fpl_data)
+            fpl_data = new_fpl_data
+            fpl_data_fetched_at = time.monotonic()
             print("FPL data fetched and cached.")
         except requests.RequestException as e:
+            # Keep serving the previous data (if any) when a refresh fails
             print(f"Error fetching FPL data: {e}")
-            return None
     return fpl_data
 
 def fetch_fixtures_data():
-    """Fetches and caches the FPL fixtures data."""
-    global fixtures_data
-    if fixtures_data is None:
+    """Fetches and caches the FPL fixtures data, refreshing it once it goes stale."""
+    global fixtures_data, fixtures_data_fetched_at
+    if fixtures_data is None or is_stale(fixtures_data_fetched_at):
         try:
-            response = requests.get("https://fantasy.premierleague.com/api/fixtures/")
+            response = _session.get(FIXTURES_URL, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             fixtures_data = response.json()
+            fixtures_data_fetched_at = time.monotonic()
             print("FPL fixtures data fetched and cached.")
         except requests.RequestException as e:
+            # Keep serving the previous fixtures (if any) when a refresh fails
             print(f"Error fetching FPL fixtures data: {e}")
-            return None
     return fixtures_data
 
+def fetch_all_data():
+    """Fetches the bootstrap and fixtures data, requesting both in parallel when not fresh."""
+    if not is_stale(fpl_data_fetched_at) and not is_stale(fixtures_data_fetched_at):
+        return fpl_data, fixtures_data
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fpl_future = executor.submit(fetch_fpl_data)
+        fixtures_future = executor.submit(fetch_fixtures_data)
+        return fpl_future.result(), fixtures_future.result()
+
+@dataclass
+class FPLIndex:
+    """Lookup structures derived from one version of the bootstrap and fixtures data."""
+    fpl_data: dict
+    fixtures_data: list
+    next_gameweek_id: int
+    player_map: dict
+    elements_by_pos: dict # Each position's players, best fixture-adjusted score first
+    difficulty_map: dict
+    element_score: dict
+    # Parallel arrays over fpl_data['elements'], indexed by element position in that list
+    element_scores: np.ndarray
+    score_order: np.ndarray
+    element_positions: np.ndarray
+    element_prices: np.ndarray
+    element_teams: np.ndarray
+
+def build_fpl_index(all_fpl_data, all_fixtures):
+    """Builds the per-player lookups that every analysis needs."""
+    # Find the next gameweek ID
+    next_gameweek_id = None
+    for event in all_fpl_data.get('events', []):
+        if event.get('is_next'):
+            next_gameweek_id = event.get('id')
+            break
+
+    difficulty_map = build_difficulty_map(next_gameweek_id, all_fixtures)
+
+    elements = all_fpl_data['elements']
+
+    # Score every player in one vectorized pass
+    count = len(elements)
+    forms = np.fromiter((float(p.get('form', 0.0)) for p in elements), dtype=np.float64, count=count)
+    points_per_game = np.fromiter((float(p.get('points_per_game', 0.0)) for p in elements), dtype=np.float64, count=count)
+    fixture_difficulties = np.fromiter(
+        (get_player_fixture_difficulty(p['team'], difficulty_map) for p in elements), dtype=np.int64, count=count
+    )
+    element_scores = calculate_player_scores(forms, points_per_game, fixture_difficulties)
+    # Best first; a stable sort keeps equally scored players in their original order
+    score_order = np.argsort(-element_scores, kind='stable')
+
+    # Bucket players by position, walking them best-first so each bucket stays sorted by score
+    # 1:GKP, 2:DEF, 3:MID, 4:FWD
+    elements_by_pos = {1: [], 2: [], 3: [], 4: []}
+    for i in score_order.tolist():
+        elements_by_pos[elements[i]['element_type']].append(elements[i])
+
+    return FPLIndex(
+        fpl_data=all_fpl_data,
+        fixtures_data=all_fixtures,
+        next_gameweek_id=next_gameweek_id,
+        player_map={p['id']: p for p in elements},
+        elements_by_pos=elements_by_pos,
+        difficulty_map=difficulty_map,
+        element_score=dict(zip((p['id'] for p in elements), element_scores.tolist())),
+        element_scores=element_scores,
+        score_order=score_order,
+        element_positions=np.fromiter((p['element_type'] for p in elements), dtype=np.int64, count=count),
+        element_prices=np.fromiter((p['now_cost'] for p in elements), dtype=np.int64, count=count),
+        element_teams=np.fromiter((p['team'] for p in elements), dtype=np.int64, count=count),
+    )
+
+def get_fpl_index():
+    """Returns the cached FPL index, rebuilding it whenever the underlying data has been refreshed."""
+    global fpl_index
+    all_fpl_data, all_fixtures = fetch_all_data()
+    if not all_fpl_data:
+        return None
+
+    if fpl_index is None or fpl_index.fpl_data is not all_fpl_data or fpl_index.fixtures_data is not all_fixtures:
+        fpl_index = build_fpl_index(all_fpl_data, all_fixtures)
+    return fpl_index
+
 # --- Core Logic ---
 
-def get_club_logo_url(team_id, teams_data):
-    """Constructs the club logo URL for a given team ID."""
-    for team in teams_data:
-        if team['id'] == team_id:
-            # The 'code' property corresponds to the team's badge image ID.
-            team_code = team['code']
-            return f"https://resources.premierleague.com/premierleague/badges/70/t{team_code}.png"
-    return "" # Return empty string if team not found
+def build_club_logo_urls(teams_data):
+    """Builds a team ID -> club logo URL map."""
+    # The 'code' property corresponds to the team's badge image ID.
+    return {
+        team['id']: f"https://resources.premierleague.com/premierleague/badges/70/t{team['code']}.png"
+        for team in teams_data
+    }
+
+def get_club_logo_url(team_id, club_logo_urls):
+    """Looks up the club logo URL for a given team ID."""
+    return club_logo_urls.get(team_id, "") # Return empty string if team not found
 
 def get_player_face_url(player):
     """Constructs the face URL for a player, with a placeholder for missing photos."""
@@ -67,19 +180,75 @@ def get_player_face_url(player):
         
     return f"https://resources.premierleague.com/premierleague/photos/players/40x40/p{photo_id}.png"
 
+def cache_player_image_urls(all_fpl_data):
+    """Stores each player's face and club logo URLs on the player object, as they never change."""
+    club_logo_urls = build_club_logo_urls(all_fpl_data['teams'])
+    for p in all_fpl_data['elements']:
+        p['_face_url'] = get_player_face_url(p)
+        p['_logo_url'] = get_club_logo_url(p['team'], club_logo_urls)
+
+def build_players_payload(all_fpl_data):
+    """Builds the structured list of all players served by /api/players, sorted by name within each position."""
+    elements = all_fpl_data['elements']
+    teams_data = all_fpl_data['teams']
+    teams = {team['id']: team['short_name'] for team in all_fpl_data['teams']}
+    
+    # 1:GKP, 2:DEF, 3:MID, 4:FWD
+    players_by_pos = {1: [], 2: [], 3: [], 4: []} 
+    
+    for p in elements:
+        player_data = {
+            'id': p['id'],
+            'name': p['web_name'],
+            'team': teams.get(p['team'], '???'),
+            'team_id': p['team'],
+            'price': p['now_cost'] / 10.0,
+            'face_url': p['_face_url'],
+            'club_logo_url': p['_logo_url'],
+            'status': p.get('status', 'a'),
+            'chance_of_playing': p.get('chance_of_playing_this_round'), # Can be null if 100
+            'selected_by': p.get('selected_by_percent', '0.0')
+        }
+        players_by_pos[p['element_type']].append(player_data)
+        
+    # Sort players within each position by name
+    for pos in players_by_pos:
+        players_by_pos[pos].sort(key=lambda x: x['name'])
+        
+    return {
+        'players': players_by_pos,
+        'teams': teams_data
+    }
+
+def cache_players_response(all_fpl_data):
+    """Serializes the /api/players payload once per fetch, along with an ETag of its contents."""
+    global players_response
+    body = orjson.dumps(build_players_payload(all_fpl_data), option=orjson.OPT_NON_STR_KEYS)
+    players_response = (body, hashlib.blake2b(body, digest_size=8).hexdigest())
+
+# Map difficulty to a modifier. An easy fixture boosts the score, a hard one reduces it.
+DIFFICULTY_MODIFIERS = {1: 1.2, 2: 1.1, 3: 1.0, 4: 0.9, 5: 0.8}
+# The same modifiers indexed by difficulty, with slot 0 as the neutral fallback for unknown values.
+DIFFICULTY_MODIFIER_ARRAY = np.array([1.0] + [DIFFICULTY_MODIFIERS[d] for d in range(1, 6)])
+
 def calculate_player_score(player, fixture_difficulty=3):
     """
     Calculates a weighted score for a player, adjusted for fixture difficulty.
     Fixture difficulty is 1 (easy) to 5 (hard).
     """
     base_score = (float(player.get('form', 0.0)) * 0.6) + (float(player.get('points_per_game', 0.0)) * 0.4)
-    
-    # Map difficulty to a modifier. An easy fixture boosts the score, a hard one reduces it.
-    difficulty_modifiers = {1: 1.2, 2: 1.1, 3: 1.0, 4: 0.9, 5: 0.8}
-    modifier = difficulty_modifiers.get(fixture_difficulty, 1.0)
+    modifier = DIFFICULTY_MODIFIERS.get(fixture_difficulty, 1.0)
     
     return base_score * modifier
 
+def calculate_player_scores(forms, points_per_game, fixture_difficulties):
+    """Vectorized calculate_player_score over parallel arrays of form, points per game and difficulty."""
+    base_scores = (forms * 0.6) + (points_per_game * 0.4)
+    valid = (fixture_difficulties >= 1) & (fixture_difficulties <= 5)
+    modifiers = DIFFICULTY_MODIFIER_ARRAY[np.where(valid, fixture_difficulties, 0)]
+
+    return base_scores * modifiers
+
 def rate_team(starting_players_with_difficulty, captain_id):
     """Rates a team based on a weighted score, including fixture difficulty."""
     if not starting_players_with_difficulty:
@@ -107,60 +276,64 @@ def rate_team(starting_players_with_difficulty, captain_id):
     rating = min(100, (total_score / max_possible_score) * 100)
     return round(rating)
 
-def get_player_fixture_difficulty(player_team_id, gameweek_id, all_fixtures):
-    """Finds a team's next fixture and returns its difficulty score (1-5)."""
+def build_difficulty_map(gameweek_id, all_fixtures):
+    """Builds a team ID -> fixture difficulty (1-5) map for the given gameweek in a single pass."""
+    difficulty_map = {}
     if not all_fixtures or not gameweek_id:
-        return 3 # Default to neutral if data is unavailable
+        return difficulty_map # Empty map means every team defaults to neutral
 
     for fixture in all_fixtures:
         if fixture['event'] == gameweek_id:
-            if fixture['team_h'] == player_team_id:
-                return fixture['team_h_difficulty']
-            if fixture['team_a'] == player_team_id:
-                return fixture['team_a_difficulty']
-    return 3 # Default to neutral difficulty if fixture not found for some reason
+            # Keep the first fixture found for teams with a double gameweek
+            difficulty_map.setdefault(fixture['team_h'], fixture['team_h_difficulty'])
+            difficulty_map.setdefault(fixture['team_a'], fixture['team_a_difficulty'])
+    return difficulty_map
+
+def get_player_fixture_difficulty(player_team_id, difficulty_map):
+    """Looks up a team's next fixture difficulty score (1-5)."""
+    # Default to neutral difficulty if the team has no fixture or data is unavailable
+    return difficulty_map.get(player_team_id, 3)
 
-def suggest_replacements(team_players_with_difficulty, all_elements, all_teams, all_fixtures, next_gameweek_id):
+def suggest_replacements(team_players_with_difficulty, fpl_index):
     """Suggests upgrades based on fixture-adjusted scores."""
     if not team_players_with_difficulty:
         return []
 
-    # Sort players by their fixture-adjusted score, ascending, to show worst players first.
-    team_players_with_difficulty.sort(key=lambda x: calculate_player_score(x[0], x[1]))
+    # Score each squad player once, then sort ascending to show worst players first.
+    scored_team_players = [(calculate_player_score(p, d), p) for p, d in team_players_with_difficulty]
+    scored_team_players.sort(key=lambda x: x[0])
     
     suggestions = []
     team_player_ids = {p['id'] for p, d in team_players_with_difficulty}
 
+    # Fixture-adjusted scores for every player are precomputed in the cached index
+    element_score = fpl_index.element_score
+
     # Iterate through every player in the user's squad
-    for player_to_replace, difficulty_to_replace in team_players_with_difficulty:
+    for player_to_replace_score, player_to_replace in scored_team_players:
         current_price = player_to_replace['now_cost']
         position = player_to_replace['element_type']
-        player_to_replace_score = calculate_player_score(player_to_replace, difficulty_to_replace)
-        
-        # Find all potential replacements that are a clear upgrade
-        candidates = []
-        for p in all_elements:
-            if p['element_type'] == position and p['id'] not in team_player_ids:
-                candidate_difficulty = get_player_fixture_difficulty(p['team'], next_gameweek_id, all_fixtures)
-                candidate_score = calculate_player_score(p, candidate_difficulty)
-                if p['now_cost'] <= current_price and candidate_score > player_to_replace_score:
-                    # Store the candidate and their calculated score to avoid recalculating
-                    candidates.append((p, candidate_score))
         
-        # If there are any candidates, find the one with the best score
-        if candidates:
-            # Sort candidates by their pre-calculated fixture-adjusted score
-            candidates.sort(key=lambda x: x[1], reverse=True)
-            best_replacement, best_replacement_score = candidates[0]
-            
+        # Candidates are sorted best-first, so the first affordable player outside the squad
+        # is the best replacement, and the first one that isn't an upgrade ends the search.
+        best_replacement = None
+        for p in fpl_index.elements_by_pos[position]:
+            if element_score[p['id']] <= player_to_replace_score:
+                break
+            if p['id'] not in team_player_ids and p['now_cost'] <= current_price:
+                best_replacement = p
+                best_replacement_score = element_score[p['id']]
+                break
+
+        if best_replacement:
             # Add this suggestion to the list
             suggestions.append({
                 'out': player_to_replace['web_name'],
-                'out_club_logo_url': get_club_logo_url(player_to_replace.get('team'), all_teams),
-                'out_face_url': get_player_face_url(player_to_replace),
+                'out_club_logo_url': player_to_replace['_logo_url'],
+                'out_face_url': player_to_replace['_face_url'],
                 'in': best_replacement['web_name'],
-                'in_club_logo_url': get_club_logo_url(best_replacement.get('team'), all_teams),
-                'in_face_url': get_player_face_url(best_replacement),
+                'in_club_logo_url': best_replacement['_logo_url'],
+                'in_face_url': best_replacement['_face_url'],
                 'reason': f"Better fixture-adjusted score ({best_replacement_score:.1f} vs {player_to_replace_score:.1f}) for a similar or lower price.",
                 'score_gain': best_replacement_score - player_to_replace_score,
                 'in_player_object': best_replacement
@@ -215,89 +388,103 @@ def suggest_chips(starting_players_with_difficulty, bench_players_with_difficult
         })
     return chip_suggestions
 
-def suggest_wildcard_team(all_elements, all_teams, all_fixtures, next_gameweek_id):
-    """Builds the best possible 15-man squad within budget using a greedy value-based algorithm."""
-    all_players_with_value = []
-    for p in all_elements:
-        difficulty = get_player_fixture_difficulty(p.get('team'), next_gameweek_id, all_fixtures)
-        score = calculate_player_score(p, difficulty)
-        # We will sort by score directly to prioritize performance over value for a wildcard.
-        all_players_with_value.append({'player': p, 'score': score})
-
-    # Sort all players by their fixture-adjusted score to find the best performers.
-    all_players_with_value.sort(key=lambda x: x['score'], reverse=True)
-
-    # Build the best squad using a greedy algorithm
-    wildcard_squad = []
-    budget = 100.0
-    pos_counts = {1: 0, 2: 0, 3: 0, 4: 0}
-    pos_limits = {1: 2, 2: 5, 3: 5, 4: 3}
-    team_counts = {}
-    team_limit = 3
+@njit(cache=True)
+def greedy_wildcard(order, positions, prices, teams, pos_limits, team_limit, budget):
+    """
+    Greedily picks up to 15 player indices, walking them in the given order, within the
+    budget and the per-position and per-team limits. Compiled to native code by numba.
+    """
+    squad = np.empty(15, dtype=np.int64)
+    squad_size = 0
+    pos_counts = np.zeros(pos_limits.shape[0], dtype=np.int64)
+    team_counts = np.zeros(teams.max() + 1, dtype=np.int64)
 
-    for p_data in all_players_with_value:
-        if len(wildcard_squad) == 15:
+    for i in order:
+        if squad_size == 15:
             break
-        
-        player = p_data['player']
-        pos = player['element_type']
-        price = player['now_cost'] / 10.0
-        team_id = player['team']
 
-        # Enforce the 3-players-per-team rule
-        if team_counts.get(team_id, 0) >= team_limit:
+        pos = positions[i]
+        price = prices[i] / 10.0
+        team_id = teams[i]
+
+        # Enforce the players-per-team rule
+        if team_counts[team_id] >= team_limit:
             continue
 
         if pos_counts[pos] < pos_limits[pos] and budget >= price:
-            wildcard_squad.append(p_data)
+            squad[squad_size] = i
+            squad_size += 1
             budget -= price
             pos_counts[pos] += 1
-            team_counts[team_id] = team_counts.get(team_id, 0) + 1
-    
-    # Now, select the best starting XI from this wildcard squad
-    gkp = sorted([p for p in wildcard_squad if p['player']['element_type'] == 1], key=lambda x: x['score'], reverse=True)
-    defs = sorted([p for p in wildcard_squad if p['player']['element_type'] == 2], key=lambda x: x['score'], reverse=True)
-    mids = sorted([p for p in wildcard_squad if p['player']['element_type'] == 3], key=lambda x: x['score'], reverse=True)
-    fwds = sorted([p for p in wildcard_squad if p['player']['element_type'] == 4], key=lambda x: x['score'], reverse=True)
+            team_counts[team_id] += 1
 
-    # --- Select the best starting XI and bench from the 15-man squad ---
+    return squad[:squad_size]
+
+def suggest_wildcard_team(fpl_index):
+    """Builds the best possible 15-man squad within budget using a greedy value-based algorithm."""
+    elements = fpl_index.fpl_data['elements']
+    element_scores = fpl_index.element_scores.tolist()
+
+    # Build the best squad using a greedy algorithm, walking player indices best-first by their
+    # fixture-adjusted score to prioritize performance over value for a wildcard.
+    budget = 100.0
+    pos_limits = np.array([0, 2, 5, 5, 3], dtype=np.int64) # Indexed by position, 1:GKP .. 4:FWD
+    team_limit = 3
+    wildcard_squad = greedy_wildcard(
+        fpl_index.score_order, fpl_index.element_positions, fpl_index.element_prices,
+        fpl_index.element_teams, pos_limits, team_limit, budget
+    ).tolist()
+
+    # Now, select the best starting XI and bench from this wildcard squad
+    return pick_lineup([(elements[i], element_scores[i]) for i in wildcard_squad])
+
+def pick_lineup(scored_squad):
+    """
+    Picks the best starting XI and bench from a squad of (player, score) tuples.
+    The XI is 1 GKP plus at least 3 DEF, 2 MID and 1 FWD, and its two highest
+    scorers are made captain and vice-captain.
+    """
+    # Separate players by position and sort by score
+    by_pos_sorted = {1: [], 2: [], 3: [], 4: []}
+    for player, score in scored_squad:
+        by_pos_sorted[player['element_type']].append((player, score))
+    for pos in by_pos_sorted:
+        by_pos_sorted[pos].sort(key=lambda x: x[1], reverse=True)
+    gkp, defs, mids, fwds = by_pos_sorted[1], by_pos_sorted[2], by_pos_sorted[3], by_pos_sorted[4]
+
+    # Select the best starting XI based on formation rules and scores
     starting_xi = []
-    bench = []
+    outfield_pool = []
 
-    # 1. Pick starting GKP (best one) and bench GKP (second one)
     if gkp: starting_xi.append(gkp.pop(0))
-    if gkp: bench.append(gkp.pop(0))
-
-    # 2. Create a pool of all outfield players and sort by score
-    outfield_pool = sorted(defs + mids + fwds, key=lambda x: x['score'], reverse=True)
+    starting_xi.extend(defs[:3]); outfield_pool.extend(defs[3:])
+    starting_xi.extend(mids[:2]); outfield_pool.extend(mids[2:])
+    starting_xi.extend(fwds[:1]); outfield_pool.extend(fwds[1:])
 
-    # 3. Select a valid formation with the best players (3 DEF, 2 MID, 1 FWD minimum)
-    starting_xi.extend(outfield_pool[:3]) # Add top 3 outfielders (likely a mix)
+    # Fill remaining 4 spots with best outfield players
+    outfield_pool.sort(key=lambda x: x[1], reverse=True)
+    starting_xi.extend(outfield_pool[:4])
     
-    # 4. Fill remaining spots to make 11 starters, ensuring formation is valid
-    # This is a simplified greedy approach. A more complex one could check all valid formations.
-    # For now, we take the best remaining players to fill the XI.
-    num_starters_needed = 11 - len(starting_xi)
-    starting_xi.extend(outfield_pool[3:3+num_starters_needed])
+    # The rest form the bench (GKP first, then others, already sorted by score)
+    bench = gkp + outfield_pool[4:]
     
-    # 5. The rest of the outfield players go to the bench
-    bench.extend(outfield_pool[3+num_starters_needed:])
-
-    # 6. Format the final list for the frontend
-    starting_xi.sort(key=lambda x: x['score'], reverse=True)
-    final_lineup = []
-    for i, p_data in enumerate(starting_xi):
-        role = 'Starter'
-        if i == 0: role = 'Captain'
-        if i == 1: role = 'Vice-Captain'
-        final_lineup.append({'player': p_data['player'], 'role': role})
-    for p_data in bench:
-        final_lineup.append({'player': p_data['player'], 'role': 'Sub'})    
-        
-    return final_lineup
+    # Format the final list for the frontend, keeping the XI in formation order.
+    # The highest scoring player is captain, second highest is vice-captain
+    top_two = heapq.nlargest(2, range(len(starting_xi)), key=lambda i: starting_xi[i][1])
+    roles = ['Starter'] * len(starting_xi)
+    if len(top_two) > 0: roles[top_two[0]] = 'Captain'
+    if len(top_two) > 1: roles[top_two[1]] = 'Vice-Captain'
+    
+    lineup = [{'player': player, 'role': role} for (player, score), role in zip(starting_xi, roles)]
+    for player, score in bench: lineup.append({'player': player, 'role': 'Sub'})
+    return lineup
 
 # --- Flask Routes ---
 
+def orjson_response(payload):
+    """Serializes a payload with orjson, which is considerably faster than jsonify for large responses."""
+    return app.response_class(orjson.dumps(payload), mimetype='application/json')
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -305,44 +492,24 @@ def index():
 @app.route('/api/players')
 def get_all_players():
     """Provides a structured list of all players for the frontend."""
-    all_fpl_data = fetch_fpl_data()
-    if not all_fpl_data:
+    if not fetch_fpl_data():
         return jsonify({'error': 'Could not fetch FPL data.'}), 500
     
-    elements = all_fpl_data['elements']
-    teams_data = all_fpl_data['teams']
-    teams = {team['id']: team['short_name'] for team in all_fpl_data['teams']}
-    
-    # 1:GKP, 2:DEF, 3:MID, 4:FWD
-    players_by_pos = {1: [], 2: [], 3: [], 4: []} 
-    
-    for p in elements:
-        player_data = {
-            'id': p['id'],
-            'name': p['web_name'],
-            'team': teams.get(p['team'], '???'),
-            'team_id': p['team'],
-            'price': p['now_cost'] / 10.0,
-            'face_url': get_player_face_url(p),
-            'club_logo_url': get_club_logo_url(p['team'], teams_data),
-            'status': p.get('status', 'a'),
-            'chance_of_playing': p.get('chance_of_playing_this_round'), # Can be null if 100
-            'selected_by': p.get('selected_by_percent', '0.0')
-        }
-        players_by_pos[p['element_type']].append(player_data)
-        
-    # Sort players within each position by name
-    for pos in players_by_pos:
-        players_by_pos[pos].sort(key=lambda x: x['name'])
-        
-    return jsonify({
-        'players': players_by_pos,
-        'teams': teams_data
-    })
+    # The player list is built and serialized once whenever the FPL data is fetched
+    body, etag = players_response
+
+    # Repeat requests carrying a matching If-None-Match header get an empty 304
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.max_age = CACHE_TTL
+    return response.make_conditional(request)
 
 @app.route('/analyze', methods=['POST'])
 def analyze_team():
-    data = request.get_json()
+    try:
+        data = orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        data = None
     if not data or 'starting_ids' not in data or 'bench_ids' not in data or 'captain_id' not in data:
         return jsonify({'error': 'Invalid request. Starting, bench, and captain IDs are required.'}), 400
     
@@ -350,18 +517,19 @@ def analyze_team():
     bench_ids = data['bench_ids']
     used_chips = data.get('usedChips', {}) # Changed 'used_chips' to 'usedChips' to match JS
     all_ids = starting_ids + bench_ids
+    starting_set = set(starting_ids) # For fast starter membership checks
 
-    all_fpl_data = fetch_fpl_data()
-    if not all_fpl_data:
+    fpl_index = get_fpl_index()
+    if not fpl_index:
         return jsonify({'error': 'Could not fetch FPL data from API.'}), 500
     
-    all_fixtures = fetch_fixtures_data()
+    all_fpl_data = fpl_index.fpl_data
+    all_fixtures = fpl_index.fixtures_data
     if not all_fixtures:
         # Non-fatal, we can proceed with default difficulty
         print("Warning: Could not fetch fixtures data. Proceeding without fixture analysis.")
 
-    # Create a map for quick lookups
-    player_map = {p['id']: p for p in all_fpl_data['elements']}
+    player_map = fpl_index.player_map
     
     starting_players = [player_map[pid] for pid in starting_ids if pid in player_map]
     all_players = [player_map[pid] for pid in all_ids if pid in player_map]
@@ -376,27 +544,20 @@ def analyze_team():
              'error': f'Analysis requires a starting XI of 11 players. You provided {len(starting_players)}.',
          }), 400
 
-    # Find the next gameweek ID
-    next_gameweek_id = None
-    for event in all_fpl_data.get('events', []):
-        if event.get('is_next'):
-            next_gameweek_id = event.get('id')
-            break
+    next_gameweek_id = fpl_index.next_gameweek_id
+    difficulty_map = fpl_index.difficulty_map
 
-    # Get fixture difficulty for each player
-    starting_players_with_difficulty = [
-        (p, get_player_fixture_difficulty(p.get('team'), next_gameweek_id, all_fixtures)) for p in starting_players
-    ]
+    # Get fixture difficulty for each squad player once and reuse it for the starters and bench
     all_players_with_difficulty = [
-        (p, get_player_fixture_difficulty(p.get('team'), next_gameweek_id, all_fixtures)) for p in all_players
-    ]
-    bench_players = [p for p in all_players if p['id'] not in starting_ids]
-    bench_players_with_difficulty = [
-        (p, get_player_fixture_difficulty(p.get('team'), next_gameweek_id, all_fixtures)) for p in bench_players
+        (p, get_player_fixture_difficulty(p.get('team'), difficulty_map)) for p in all_players
     ]
+    player_difficulty = {p['id']: d for p, d in all_players_with_difficulty}
+    starting_players_with_difficulty = [(p, player_difficulty[p['id']]) for p in starting_players]
+    bench_players = [p for p in all_players if p['id'] not in starting_set]
+    bench_players_with_difficulty = [(p, player_difficulty[p['id']]) for p in bench_players]
 
     team_rating = rate_team(starting_players_with_difficulty, data.get('captain_id'))
-    suggestions = suggest_replacements(all_players_with_difficulty, all_fpl_data['elements'], all_fpl_data['teams'], all_fixtures, next_gameweek_id)
+    suggestions = suggest_replacements(all_players_with_difficulty, fpl_index)
 
     # Sort suggestions by the highest score gain
     suggestions.sort(key=lambda x: x.get('score_gain', 0), reverse=True)
@@ -420,53 +581,14 @@ def analyze_team():
         players_kept = [p for p in current_squad_players if p.get('web_name') not in out_player_names]
         new_squad_players = players_kept + players_in
 
-        # Calculate fixture-adjusted scores for the new squad
-        new_squad_with_scores = []
-        for p in new_squad_players:
-            difficulty = get_player_fixture_difficulty(p.get('team'), next_gameweek_id, all_fixtures)
-            score = calculate_player_score(p, difficulty)
-            new_squad_with_scores.append({'player': p, 'score': score})
-
-        # Separate players by position and sort by score
-        gkp = sorted([p for p in new_squad_with_scores if p['player']['element_type'] == 1], key=lambda x: x['score'], reverse=True)
-        defs = sorted([p for p in new_squad_with_scores if p['player']['element_type'] == 2], key=lambda x: x['score'], reverse=True)
-        mids = sorted([p for p in new_squad_with_scores if p['player']['element_type'] == 3], key=lambda x: x['score'], reverse=True)
-        fwds = sorted([p for p in new_squad_with_scores if p['player']['element_type'] == 4], key=lambda x: x['score'], reverse=True)
-
-        # Select the best starting XI based on formation rules and scores
-        starting_xi = []
-        outfield_pool = []
-
-        if gkp: starting_xi.append(gkp.pop(0))
-        starting_xi.extend(defs[:3]); outfield_pool.extend(defs[3:])
-        starting_xi.extend(mids[:2]); outfield_pool.extend(mids[2:])
-        starting_xi.extend(fwds[:1]); outfield_pool.extend(fwds[1:])
-
-        # Fill remaining 4 spots with best outfield players
-        outfield_pool.sort(key=lambda x: x['score'], reverse=True)
-        starting_xi.extend(outfield_pool[:4])
-        
-        # The rest form the bench (GKP first, then others sorted by score)
-        bench = gkp + sorted(outfield_pool[4:], key=lambda x: x['score'], reverse=True)
-        
-        # Format the final list for the frontend
-        # The highest scoring player is captain, second highest is vice-captain
-        starting_xi.sort(key=lambda x: x['score'], reverse=True)
-        
-        for i, p_data in enumerate(starting_xi):
-            role = 'Starter'
-            if i == 0: role = 'Captain'
-            if i == 1: role = 'Vice-Captain'
-            suggested_lineup_ft.append({'player': p_data['player'], 'role': role})
-        for p_data in bench: suggested_lineup_ft.append({'player': p_data['player'], 'role': 'Sub'})
+        # Pick the best lineup from the new squad using the precomputed fixture-adjusted scores
+        suggested_lineup_ft = pick_lineup([(p, fpl_index.element_score[p['id']]) for p in new_squad_players])
 
     # --- Generate Wildcard Lineup if suggested ---
     suggested_lineup_wc = []
     is_wildcard_suggested = any(c['chip'] == 'Wildcard' for c in chip_suggestions)
     if is_wildcard_suggested:
-        suggested_lineup_wc = suggest_wildcard_team(
-            all_fpl_data['elements'], all_fpl_data['teams'], all_fixtures, next_gameweek_id
-        )
+        suggested_lineup_wc = suggest_wildcard_team(fpl_index)
         
     # --- Generate Gameweek Fixtures List ---
     gameweek_fixtures = []
@@ -489,11 +611,11 @@ def analyze_team():
             'form': p.get('form', '0.0'),
             'price': p.get('now_cost', 0) / 10.0,
             'points': p.get('total_points', 0),
-            'role': 'Starter' if p.get('id') in starting_ids else 'Sub'
+            'role': 'Starter' if p.get('id') in starting_set else 'Sub'
         })
     team_details.sort(key=lambda x: (x['role'] != 'Starter', x['name']))
 
-    return jsonify({
+    return orjson_response({
         'team_rating': team_rating,
         'free_transfers': free_transfers,
         'other_suggestions': other_suggestions,
@@ -521,6 +643,5 @@ def analyze_team():
     })
 
 if __name__ == '__main__':
-    fetch_fpl_data() # Pre-fetch data on startup
-    fetch_fixtures_data() # Pre-fetch fixtures on startup
+    fetch_all_data() # Pre-fetch data and fixtures on startup
     app.run(debug=True, port=5001)
\ No newline at end of file